@@ -1,9 +1,13 @@
 # Import necessary libraries
+import argparse # For command-line arguments
 import asyncio  # For handling asynchronous operations
+import importlib.util
 import os       # For environment variable access
 import sys      # For system-specific parameters and functions
-from typing import Optional
+from functools import partial
+from typing import Callable, Optional
 from contextlib import AsyncExitStack
+from datetime import datetime, timedelta, timezone
 
 # Import MCP client components
 from mcp import ClientSession, StdioServerParameters
@@ -14,8 +18,16 @@ from google import genai
 from google.genai import types
 from google.genai.types import Tool, FunctionDeclaration, GenerateContentConfig
 
+import httpx
+import orjson
 from dotenv import load_dotenv
 
+from llm_cache import LLMCache, RedisBackend, SemanticCache
+from tool_index import (
+    LAZY_TOOLS_THRESHOLD, SEARCH_TOOLS_DEFAULT_K, SEARCH_TOOLS_NAME, SEARCH_TOOLS_TOOL, ToolIndex,
+)
+from tool_script import TOOL_SCRIPT_NAME, TOOL_SCRIPT_TOOL, run_tool_script
+
 # Rich for CLI styling
 from rich.console import Console
 from rich.panel import Panel
@@ -32,17 +44,81 @@ from rich.console import Console
 
 console = Console()
 
+GEMINI_MODEL = 'gemini-2.0-flash-001'
+EMBEDDING_MODEL = 'text-embedding-004'
+DEFAULT_SEMANTIC_CACHE_PATH = "~/.cache/mcplink/semantic_cache.npz"
+
+# Tools whose raw output is shown to the user as-is, without a follow-up Gemini call
+TOOL_PASSTHROUGH = {"run_command", "create_file"}
+BATCH_POLL_INTERVAL = 10  # Seconds between batch job status checks
+BATCH_DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+GEMINI_TIMEOUT_MS = 60_000
+CONTEXT_CACHE_MIN_TOKENS = 4096  # Uncached prompt tokens before the history is moved to a context cache
+CONTEXT_CACHE_TTL = 3600         # Seconds a context cache lives
+MAX_TOOL_ROUNDS = 5              # Rounds of tool calls Gemini may make for one query
+HISTORY_MAX_TOKENS = 400_000     # Estimated history size at which the oldest exchanges are dropped
+HISTORY_TRIM_TOKENS = 300_000    # Size the history is trimmed to, so the context cache isn't rebuilt every turn
+CHARS_PER_TOKEN = 4              # Rough ratio used to estimate the tokens of serialized contents
+
+# Keep connections to the Gemini API alive between queries; HTTP/2 needs the optional h2 package
+HTTP_CLIENT_ARGS = {
+    "http2": importlib.util.find_spec("h2") is not None,
+    "limits": httpx.Limits(max_keepalive_connections=20, keepalive_expiry=300),
+}
+
 def print_ascii_banner(text: str):
     """Display a large ASCII banner."""
     ascii_banner = pyfiglet.figlet_format(text)
     console.print(f"[bold cyan]{ascii_banner}[/bold cyan]")
 
 
+def print_response(response: str, title: str = "Gemini Response"):
+    """Display a Gemini response, highlighting it if it looks like code."""
+    if "def " in response or "import " in response:
+        syntax = Syntax(response, "python", theme="monokai", line_numbers=True)
+        console.print(Panel(syntax, title=f"[bold blue]{title}[/bold blue]", border_style="blue"))
+    else:
+        console.print(Panel(response, title=f"[bold blue]{title}[/bold blue]", border_style="blue"))
+
+
+# Contents are built with model_construct: their fields are always well-formed here, and
+# validating large tool results on every turn is measurable in tool-heavy batch runs
+def text_content(role: str, text: str) -> types.Content:
+    """Build a single-part text turn."""
+    return types.Content.model_construct(role=role, parts=[types.Part.model_construct(text=text)])
+
+
+def tool_response_content(function_calls, function_responses) -> types.Content:
+    """Build the tool turn answering a model turn's function calls."""
+    return types.Content.model_construct(
+        role='tool',
+        parts=[
+            types.Part.model_construct(
+                function_response=types.FunctionResponse.model_construct(name=fc.name, response=function_response)
+            )
+            for fc, function_response in zip(function_calls, function_responses)
+        ]
+    )
+
+
 class MCPClient:
     def __init__(self):
         """Initialize the MCP client and configure the Gemini API."""
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
+        self._gen_config: Optional[GenerateContentConfig] = None
+
+        # Conversation so far, sent with every request; a prefix of it may live in a context cache
+        self._history: list[types.Content] = []
+        self._context_cache: Optional[types.CachedContent] = None
+        self._context_cache_config: Optional[GenerateContentConfig] = None
+        self._cached_turns = 0
+        # (contents, estimated tokens) of each complete exchange in the history, oldest first
+        self._exchanges: list[tuple[int, int]] = []
+
+        # With many server tools, only search_tools is declared; its matches are added per query
+        self.tool_index: Optional[ToolIndex] = None
+        self._turn_tools: dict[str, Tool] = {}
 
         # Retrieve the Gemini API key from environment variables
         gemini_api_key = os.getenv("GEMINI_API_KEY")
@@ -50,12 +126,51 @@ class MCPClient:
             console.print("[bold red]Error:[/bold red] GEMINI_API_KEY not found. Please add it to your .env file.")
             sys.exit(1)
 
-        # Configure the Gemini AI client
-        self.genai_client = genai.Client(api_key=gemini_api_key)
+        # Configure the Gemini AI client (requests go through its async API, genai_client.aio)
+        self.genai_client = genai.Client(
+            api_key=gemini_api_key,
+            http_options=types.HttpOptions(
+                timeout=GEMINI_TIMEOUT_MS,
+                client_args=HTTP_CLIENT_ARGS,
+                async_client_args=HTTP_CLIENT_ARGS,
+            ),
+        )
+        self._background_tasks: set[asyncio.Task] = set()
+
+        # Cache deterministic Gemini responses (shared via Redis if REDIS_URL is set)
+        redis_url = os.getenv("REDIS_URL")
+        self.cache = LLMCache(RedisBackend(redis_url) if redis_url else None)
+
+        # Answer paraphrases of tool-free opening questions from this or earlier sessions without a generation call
+        self.semantic_cache = SemanticCache(
+            self.embed_query,
+            path=os.path.expanduser(os.getenv("SEMANTIC_CACHE_PATH", DEFAULT_SEMANTIC_CACHE_PATH)),
+        )
+
+    async def embed_query(self, query: str) -> list[float]:
+        """Embed a query for the semantic cache."""
+        result = await self.genai_client.aio.models.embed_content(model=EMBEDDING_MODEL, contents=query)
+        return result.embeddings[0].values
+
+    async def warm_up(self):
+        """Open the connection to the Gemini API ahead of the first query."""
+        try:
+            await self.genai_client.aio.models.list(config={"page_size": 1})
+        except Exception:
+            pass  # Connection problems will surface on the first real query
+
+    def start_background(self, coro):
+        """Run a coroutine that nothing waits for; cleanup() cancels it if it is still running."""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
 
     async def connect_to_server(self, server_script_path: str):
         """Connect to the MCP server and list available tools."""
 
+        # Do DNS and the TLS handshake with Gemini while the server starts up
+        self.start_background(self.warm_up())
+
         # Determine whether the server script is Python or JavaScript
         command = "python" if server_script_path.endswith('.py') else "node"
 
@@ -82,86 +197,357 @@ class MCPClient:
         ))
 
         # Convert MCP tools to Gemini format
-        self.function_declarations = convert_mcp_tools_to_gemini(tools)
-
-    async def process_query(self, query: str) -> str:
-        """Process a user query using the Gemini API and execute tool calls if needed."""
-
-        # Format user input for Gemini
-        user_prompt_content = types.Content(
-            role='user',
-            parts=[types.Part.from_text(text=query)]
+        server_tools = convert_mcp_tools_to_gemini(tools)
+        if len(tools) > LAZY_TOOLS_THRESHOLD:
+            # Too many definitions to send with every request; Gemini searches for the ones it needs
+            self.tool_index = ToolIndex(server_tools)
+            core_tools, core_names = [SEARCH_TOOLS_TOOL], [SEARCH_TOOLS_NAME]
+        else:
+            core_tools, core_names = server_tools, [tool.name for tool in tools]
+
+        # Plus the tool script runner for multi-tool tasks
+        self.function_declarations = core_tools + [TOOL_SCRIPT_TOOL]
+        self.tool_names = core_names + [TOOL_SCRIPT_NAME]
+
+        # Built once and reused by every generate_content call
+        self._gen_config = GenerateContentConfig(tools=self.function_declarations)
+
+    async def print_tool_progress(self, progress: float, total: Optional[float], message: Optional[str]):
+        """Print tool output streamed by the server as progress notifications."""
+        if message:
+            console.print(message, end="", style="dim", markup=False, highlight=False)
+
+    async def call_mcp_tool(self, tool_name: str, tool_args: Optional[dict], on_streamed: Optional[Callable[[], None]] = None):
+        """Call an MCP tool, printing its streamed output as it arrives; `on_streamed` is told when some was printed."""
+        async def print_progress(progress: float, total: Optional[float], message: Optional[str]):
+            if message and on_streamed is not None:
+                on_streamed()
+            await self.print_tool_progress(progress, total, message)
+
+        return await self.session.call_tool(tool_name, tool_args, progress_callback=print_progress)
+
+    def search_tools(self, query: str, k: int = SEARCH_TOOLS_DEFAULT_K) -> list[dict]:
+        """Find tools for a query and make them callable for the rest of the current query."""
+        console.print(f"[yellow][Tool Search][/yellow] {query}")
+
+        matches = []
+        for name in self.tool_index.search(query, int(k)):
+            tool = self.tool_index.tools[name]
+            self._turn_tools[name] = tool
+
+            # The full definition is declared on the next request, so a summary is enough here
+            matches.append({"name": name, "description": tool.function_declarations[0].description})
+        return matches
+
+    async def call_tool(self, tool_name: str, tool_args: Optional[dict], on_streamed: Optional[Callable[[], None]] = None) -> dict:
+        """Execute a tool call via MCP and return the response to send to Gemini."""
+        try:
+            if tool_name == SEARCH_TOOLS_NAME:
+                return {"result": self.search_tools(**(tool_args or {}))}
+
+            # A tool script runs all of its tool calls locally
+            if tool_name == TOOL_SCRIPT_NAME:
+                script = (tool_args or {}).get("script", "")
+                console.print(Panel(
+                    Syntax(script, "python", theme="monokai"),
+                    title=f"[yellow][Tool Call][/yellow] {tool_name}",
+                    border_style="yellow"
+                ))
+                outputs = await run_tool_script(script, self.call_mcp_tool)
+                return {"result": outputs}
+
+            console.print(f"[yellow][Tool Call][/yellow] {tool_name} with args {tool_args}")
+            result = await self.call_mcp_tool(tool_name, tool_args, on_streamed)
+            return {"result": result.content}
+        except Exception as e:
+            return {"error": str(e)}
+
+    def history_cache_key(self, contents: list[types.Content]) -> Optional[str]:
+        """Response cache key for a request carrying these contents."""
+        return self.cache.cache_key(
+            GEMINI_MODEL,
+            [content.model_dump(exclude_none=True) for content in contents],
+            self.tool_names + sorted(self._turn_tools),
         )
 
-        # Send query to Gemini with available tools
-        with console.status("[bold cyan]Processing your request...[/bold cyan]", spinner="dots"):
-            response = self.genai_client.models.generate_content(
-                model='gemini-2.0-flash-001',
-                contents=[user_prompt_content],
-                config=GenerateContentConfig(
+    def request_contents(self) -> tuple[list[types.Content], GenerateContentConfig]:
+        """Contents and config for the next request, using the context cache if it is still alive."""
+        if self._turn_tools:
+            # The context cache holds only the core tools, so requests with searched tools go without it
+            return self._history, GenerateContentConfig(
+                tools=self.function_declarations + list(self._turn_tools.values())
+            )
+
+        cache = self._context_cache
+        if cache is not None and cache.expire_time is not None:
+            if cache.expire_time > datetime.now(timezone.utc) + timedelta(seconds=60):
+                return self._history[self._cached_turns:], self._context_cache_config
+
+        return self._history, self._gen_config
+
+    async def generate(self, status: str) -> types.GenerateContentResponse:
+        """Send the conversation to Gemini, unless the answer is cached."""
+        cache_key = self.history_cache_key(self._history)
+        response = await self.cache.get(cache_key)
+        if response is None:
+            contents, config = self.request_contents()
+            with console.status(status, spinner="dots"):
+                response = await self.genai_client.aio.models.generate_content(
+                    model=GEMINI_MODEL,
+                    contents=contents,
+                    config=config,
+                )
+            await self.cache.set(cache_key, response)
+
+            # Requests with searched tools bypass the context cache, so their token counts say nothing about it
+            if not self._turn_tools:
+                await self.update_context_cache(response)
+
+        return response
+
+    async def update_context_cache(self, response: types.GenerateContentResponse):
+        """Move the conversation into a Gemini context cache once enough of it is uncached."""
+        usage = response.usage_metadata
+        if usage is None or not usage.prompt_token_count:
+            return
+
+        uncached_tokens = usage.prompt_token_count - (usage.cached_content_token_count or 0)
+        if uncached_tokens < CONTEXT_CACHE_MIN_TOKENS:
+            return
+
+        try:
+            cache = await self.genai_client.aio.caches.create(
+                model=GEMINI_MODEL,
+                config=types.CreateCachedContentConfig(
+                    contents=list(self._history),
                     tools=self.function_declarations,
+                    ttl=f"{CONTEXT_CACHE_TTL}s",
                 ),
             )
+        except Exception:
+            return  # Caching is an optimization; keep sending the full history
+
+        await self.delete_context_cache()
+        self._context_cache = cache
+        self._cached_turns = len(self._history)
+
+        # Tools are part of the cache and must not be repeated in the request
+        self._context_cache_config = GenerateContentConfig(cached_content=cache.name)
+
+    async def delete_context_cache(self):
+        """Delete the current context cache, if any."""
+        if self._context_cache is None:
+            return
+
+        try:
+            await self.genai_client.aio.caches.delete(name=self._context_cache.name)
+        except Exception:
+            pass  # It expires on its own
+        self._context_cache = None
+        self._context_cache_config = None
+        self._cached_turns = 0
+
+    async def reset_history(self):
+        """Start a new conversation."""
+        await self.delete_context_cache()
+        self._history = []
+        self._exchanges = []
+
+    async def trim_history(self):
+        """Drop the oldest exchanges once the history outgrows HISTORY_MAX_TOKENS."""
+        total = sum(tokens for _, tokens in self._exchanges)
+        if total <= HISTORY_MAX_TOKENS:
+            return
+
+        # Whole exchanges go, so every function call keeps its response; the latest one always stays
+        dropped = 0
+        while total > HISTORY_TRIM_TOKENS and len(self._exchanges) > 1:
+            contents, tokens = self._exchanges.pop(0)
+            dropped += contents
+            total -= tokens
+        del self._history[:dropped]
+
+        # The cached prefix is no longer the start of the conversation
+        await self.delete_context_cache()
+
+    async def process_query(self, query: str) -> str:
+        """Process a user query using the Gemini API and execute tool calls if needed."""
+        history_length = len(self._history)
+        try:
+            response = await self.run_turn(query)
+        except BaseException:
+            # Drop the unfinished turn; it may hold function calls without responses
+            del self._history[history_length:]
+            if self._cached_turns > history_length:
+                await self.delete_context_cache()
+            raise
+
+        exchange = self._history[history_length:]
+        size = sum(
+            len(orjson.dumps(content.model_dump(exclude_none=True), default=str)) for content in exchange
+        )
+        self._exchanges.append((len(exchange), size // CHARS_PER_TOKEN))
+        await self.trim_history()
+        return response
+
+    async def run_turn(self, query: str) -> str:
+        """Add one user query and Gemini's answer, including any tool calls, to the conversation."""
+
+        # Paraphrase matching ignores context, so only the opening question of a conversation
+        # uses it, and the query is only embedded up front when there is something to match
+        opening_turn = not self._history
+        query_vector = None
+        if opening_turn and len(self.semantic_cache):
+            cached_text, query_vector = await self.semantic_cache.lookup(query)
+            if cached_text is not None:
+                self._history.append(text_content('user', query))
+                self._history.append(text_content('model', cached_text))
+                return cached_text
+
+        # Format user input for Gemini and add it to the conversation
+        self._history.append(text_content('user', query))
+
+        # Tools found by search_tools only stay declared for this query
+        self._turn_tools = {}
+
+        # Send the conversation to Gemini with available tools
+        response = await self.generate("[bold cyan]Processing your request...[/bold cyan]")
 
         final_text = []
+        used_tools = False
+
+        for tool_round in range(MAX_TOOL_ROUNDS + 1):
+            function_calls = []
+
+            # Split Gemini's response into text and tool calls
+            model_content = response.candidates[0].content
+            self._history.append(model_content)
+            for part in model_content.parts or []:
+                if part.function_call:
+                    function_calls.append(part.function_call)
+                elif part.text is not None:
+                    final_text.append(part.text)
+
+            if not function_calls:
+                break
+            used_tools = True
+
+            if tool_round == MAX_TOOL_ROUNDS:
+                # Answer the pending calls so the conversation stays well-formed, then stop
+                self._history.append(tool_response_content(
+                    function_calls, [{"error": "Tool call limit reached"}] * len(function_calls)
+                ))
+                self._history.append(text_content('model', "(Stopped: tool call limit reached.)"))
+                final_text.append(f"⚠️ Stopped after {MAX_TOOL_ROUNDS} rounds of tool calls.")
+                break
+
+            # Execute all requested tools concurrently, noting which ones printed streamed output
+            streamed = set()
+            function_responses = await asyncio.gather(
+                *(self.call_tool(fc.name, fc.args, partial(streamed.add, index)) for index, fc in enumerate(function_calls))
+            )
+
+            # Format all tool results as a single response for Gemini
+            self._history.append(tool_response_content(function_calls, function_responses))
+
+            # Raw output of passthrough tools is the answer; skip the summarizing round-trip
+            if all(fc.name in TOOL_PASSTHROUGH for fc in function_calls):
+                for index, function_response in enumerate(function_responses):
+                    if "error" in function_response:
+                        final_text.append(f"❌ Error: {function_response['error']}")
+                        continue
+
+                    texts = [
+                        item.text for item in function_response["result"]
+                        if getattr(item, "text", None) is not None
+                    ]
+                    if index in streamed:
+                        # The output is already on the console; keep only its last line (e.g. the exit code)
+                        texts = [text.rstrip("\n").rpartition("\n")[2] for text in texts]
+                    final_text.extend(texts)
+
+                # Close the model's turn; the output itself is already in the tool response
+                self._history.append(text_content('model', "(Tool output was shown to the user.)"))
+                break
+
+            # Send tool results back to Gemini
+            response = await self.generate("[bold cyan]Processing tool results...[/bold cyan]")
 
-        # Process Gemini's response
-        for candidate in response.candidates:
-            if candidate.content.parts:
-                for part in candidate.content.parts:
-                    if isinstance(part, types.Part):
-                        if part.function_call:
-                            # Execute the requested tool
-                            tool_name = part.function_call.name
-                            tool_args = part.function_call.args
-
-                            console.print(f"[yellow][Tool Call][/yellow] {tool_name} with args {tool_args}")
-
-                            # Execute the tool via MCP
-                            try:
-                                result = await self.session.call_tool(tool_name, tool_args)
-                                function_response = {"result": result.content}
-                            except Exception as e:
-                                function_response = {"error": str(e)}
-
-                            # Format response for Gemini
-                            function_response_part = types.Part.from_function_response(
-                                name=tool_name,
-                                response=function_response
-                            )
-
-                            function_response_content = types.Content(
-                                role='tool',
-                                parts=[function_response_part]
-                            )
-
-                            # Send tool result back to Gemini
-                            response = self.genai_client.models.generate_content(
-                                model='gemini-2.0-flash-001',
-                                contents=[
-                                    user_prompt_content,
-                                    part,
-                                    function_response_content,
-                                ],
-                                config=GenerateContentConfig(
-                                    tools=self.function_declarations,
-                                ),
-                            )
-
-                            text_part = getattr(response.candidates[0].content.parts[0], "text", None)
-                            if text_part is not None:
-                                final_text.append(text_part)
-                        else:
-                            text_part = getattr(part, "text", None)
-                            if text_part is not None:
-                                final_text.append(text_part)
+        # Answers that ran tools depend on tool results (file contents, command
+        # output), so only tool-free answers are reused for similar queries
+        if opening_turn and not used_tools:
+            # Embedding the query, if still needed, happens after the answer is returned
+            self.start_background(self.semantic_cache.store(query, "\n".join(final_text), query_vector))
 
         return "\n".join(final_text)
 
+    async def process_batch(self, queries: list[str]) -> list[str]:
+        """Process several queries in one Gemini Batch API job.
+
+        Queries whose batch response asks for a tool call are re-run through
+        process_query, so tool execution stays synchronous.
+        """
+        inlined_requests = [
+            types.InlinedRequest(
+                contents=[text_content('user', query)],
+                config=self._gen_config,
+            )
+            for query in queries
+        ]
+
+        with console.status(f"[bold cyan]Running batch of {len(queries)} queries...[/bold cyan]", spinner="dots"):
+            batch_job = await self.genai_client.aio.batches.create(
+                model=GEMINI_MODEL,
+                src=inlined_requests,
+                config={"display_name": "mcplink-batch"},
+            )
+
+            # Poll until the job reaches a terminal state
+            while batch_job.state.name not in BATCH_DONE_STATES:
+                await asyncio.sleep(BATCH_POLL_INTERVAL)
+                batch_job = await self.genai_client.aio.batches.get(name=batch_job.name)
+
+        if batch_job.state.name != "JOB_STATE_SUCCEEDED":
+            error = batch_job.error.message if batch_job.error else batch_job.state.name
+            return [f"❌ Batch job failed: {error}"] * len(queries)
+
+        results = []
+
+        # Inlined responses come back in request order
+        for query, inlined_response in zip(queries, batch_job.dest.inlined_responses):
+            if inlined_response.error:
+                results.append(f"❌ Error: {inlined_response.error.message}")
+                continue
+
+            response = inlined_response.response
+
+            # Seed the cache so a tool-call fallback skips the first generate_content. Batch
+            # requests carry only the core tools, as the fallback's first request will
+            self._turn_tools = {}
+            user_content = text_content('user', query)
+            await self.cache.set(self.history_cache_key([user_content]), response)
+
+            if response.function_calls:
+                # Batch queries are independent, so each fallback starts a fresh conversation
+                await self.reset_history()
+                try:
+                    results.append(await self.process_query(query))
+                except Exception as e:
+                    # One failed fallback must not lose the other results
+                    results.append(f"❌ Error: {e}")
+            else:
+                results.append(response.text or "")
+
+        return results
+
     async def chat_loop(self):
         """Run an interactive chat session with the user."""
         print_ascii_banner("MCPLink")
-        console.print(Panel.fit("🤖 [bold cyan]MCP Client Started![/bold cyan]\nType 'quit' to exit", border_style="cyan"))
+        console.print(Panel.fit(
+            "🤖 [bold cyan]MCP Client Started![/bold cyan]\n"
+            "Type 'quit' to exit, '/reset' to start a new conversation, '/cache stats' for cache statistics",
+            border_style="cyan"
+        ))
 
         while True:
             query = Prompt.ask("[bold green]Query[/bold green]")
@@ -169,30 +555,106 @@ class MCPClient:
                 console.print("[bold red]Goodbye![/bold red]")
                 break
 
-            response = await self.process_query(query)
-
-            # If Gemini's output looks like code, highlight it
-            if "def " in response or "import " in response:
-                syntax = Syntax(response, "python", theme="monokai", line_numbers=True)
-                console.print(Panel(syntax, title="[bold blue]Gemini Response[/bold blue]", border_style="blue"))
-            else:
-                console.print(Panel(response, title="[bold blue]Gemini Response[/bold blue]", border_style="blue"))
+            if query.strip().lower() == '/reset':
+                await self.reset_history()
+                console.print("[bold cyan]Started a new conversation.[/bold cyan]")
+                continue
+
+            if query.strip().lower() == '/cache stats':
+                stats = self.cache.stats()
+                console.print(Panel.fit(
+                    f"Hits: [green]{stats['hits']}[/green]\n"
+                    f"Misses: [yellow]{stats['misses']}[/yellow]\n"
+                    f"Hit rate: [cyan]{stats['hit_rate']:.0%}[/cyan]\n"
+                    f"Semantic hits: [green]{self.semantic_cache.hits}[/green] "
+                    f"of [cyan]{self.semantic_cache.hits + self.semantic_cache.misses}[/cyan] queries",
+                    title="[bold blue]Response Cache[/bold blue]",
+                    border_style="blue"
+                ))
+                continue
+
+            try:
+                response = await self.process_query(query)
+            except Exception as e:
+                console.print(f"[bold red]Error:[/bold red] {e}")
+                continue
+
+            print_response(response)
+
+    async def run_batch(self, batch_file: str):
+        """Run newline-separated queries from a file as a single batch."""
+        with open(batch_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+        if not queries:
+            console.print(f"[bold red]Error:[/bold red] No queries found in {batch_file}")
+            return
+
+        try:
+            responses = await self.process_batch(queries)
+        except Exception as e:
+            console.print(f"[bold red]Error:[/bold red] Batch failed: {e}")
+            return
+
+        for query, response in zip(queries, responses):
+            print_response(response, title=query)
 
     async def cleanup(self):
         """Clean up resources before exiting."""
+        # Warm-up and embedding requests must not outlive the client they use
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+
+        await self.delete_context_cache()
         await self.exit_stack.aclose()
+        await self.genai_client.aio.aclose()
 
 
-def clean_schema(schema):
-    """Remove 'title' fields from JSON schema for Gemini compatibility."""
-    if isinstance(schema, dict):
-        schema.pop("title", None)
+# Keywords whose values are nested schemas (a schema or a list of schemas)
+SCHEMA_CHILD_KEYS = ("items", "anyOf", "oneOf", "allOf")
 
-        if "properties" in schema and isinstance(schema["properties"], dict):
-            for key in schema["properties"]:
-                schema["properties"][key] = clean_schema(schema["properties"][key])
 
-    return schema
+def clean_schema(schema):
+    """Return a copy of a JSON schema without 'title' fields, for Gemini compatibility."""
+    if not isinstance(schema, dict):
+        return schema
+
+    cleaned_root = {}
+    stack = [(schema, cleaned_root)]
+
+    def push(node, container, slot):
+        # Copy non-schema values as-is; queue schemas to be cleaned into a new dict
+        if isinstance(node, dict):
+            container[slot] = {}
+            stack.append((node, container[slot]))
+        else:
+            container[slot] = node
+
+    # Walk the schema with an explicit stack instead of recursion
+    while stack:
+        node, cleaned = stack.pop()
+        for key, value in node.items():
+            if key != "title":
+                cleaned[key] = value
+
+        # Property names are user-defined, so only their schemas are cleaned
+        properties = node.get("properties")
+        if isinstance(properties, dict):
+            cleaned["properties"] = {}
+            for name, prop in properties.items():
+                push(prop, cleaned["properties"], name)
+
+        for key in SCHEMA_CHILD_KEYS:
+            child = node.get(key)
+            if isinstance(child, dict):
+                push(child, cleaned, key)
+            elif isinstance(child, list):
+                cleaned[key] = [None] * len(child)
+                for index, item in enumerate(child):
+                    push(item, cleaned[key], index)
+
+    return cleaned_root
 
 
 def convert_mcp_tools_to_gemini(mcp_tools):
@@ -216,14 +678,18 @@ def convert_mcp_tools_to_gemini(mcp_tools):
 
 async def main():
     """Main function to start the MCP client."""
-    if len(sys.argv) < 2:
-        console.print("[bold red]Usage:[/bold red] python client.py <path_to_server_script>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="MCPLink client")
+    parser.add_argument("server_script", help="path to the MCP server script")
+    parser.add_argument("--batch", metavar="FILE", help="run newline-separated queries from FILE as one batch")
+    args = parser.parse_args()
 
     client = MCPClient()
     try:
-        await client.connect_to_server(sys.argv[1])
-        await client.chat_loop()
+        await client.connect_to_server(args.server_script)
+        if args.batch:
+            await client.run_batch(args.batch)
+        else:
+            await client.chat_loop()
     finally:
         await client.cleanup()
 
@@ -0,0 +1,263 @@
+# Response caches for Gemini generate_content calls
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Protocol
+
+import numpy as np
+import orjson
+from google.genai import types
+from pydantic import BaseModel
+
+DEFAULT_TTL = 3600          # Seconds a cached response stays valid
+DEFAULT_MAX_ENTRIES = 256   # Entries kept by the in-memory backend
+SIMILARITY_THRESHOLD = 0.92 # Cosine similarity at which two queries count as the same
+
+
+class CacheBackend(Protocol):
+    """Storage interface used by LLMCache."""
+
+    async def get(self, key: str) -> Optional[Any]:
+        ...
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        ...
+
+
+class MemoryBackend:
+    """In-process LRU cache with per-entry expiry."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+
+        # Evict the least recently used entries
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class RedisBackend:
+    """
+    Redis-backed cache, shared between client processes.
+
+    Values are stored as JSON and validated back into `value_type`, so a
+    shared Redis cannot be used to run code in the clients reading it.
+    """
+
+    def __init__(self, url: str, value_type: type[BaseModel] = types.GenerateContentResponse):
+        # Imported lazily so redis stays an optional dependency
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self.value_type = value_type
+
+    async def get(self, key: str) -> Optional[Any]:
+        data = await self._redis.get(key)
+        return self.value_type.model_validate_json(data) if data is not None else None
+
+    async def set(self, key: str, value: Any, ttl: int) -> None:
+        await self._redis.set(key, value.model_dump_json(exclude_none=True), ex=ttl)
+
+
+class LLMCache:
+    """Cache Gemini responses for deterministic (temperature 0) requests."""
+
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl: int = DEFAULT_TTL):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cache_key(model: str, contents: list, tool_names, temperature: Optional[float] = None) -> Optional[str]:
+        """Build a cache key, or return None if the request is not deterministic."""
+        if temperature not in (None, 0):
+            return None
+
+        # Keys are computed over the whole conversation on every request, so serialize with orjson
+        payload = orjson.dumps(
+            {"model": model, "contents": contents, "tools": sorted(tool_names)},
+            option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+            default=str,
+        )
+        return hashlib.sha256(payload).hexdigest()
+
+    async def get(self, key: Optional[str]) -> Optional[Any]:
+        if key is None:
+            return None
+
+        try:
+            value = await self.backend.get(key)
+        except Exception:
+            value = None  # The cache is optional; an unreachable or corrupt backend is a miss
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: Optional[str], value: Any) -> None:
+        if key is None:
+            return
+
+        try:
+            await self.backend.set(key, value, self.ttl)
+        except Exception:
+            pass  # Failing to cache must not fail the request
+
+    def stats(self) -> dict:
+        """Return hit/miss counters."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def write_entries(path: str, vectors: np.ndarray, queries: list[str], responses: list[str]):
+    """Write semantic cache entries to an .npz file, replacing it atomically."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, vectors=vectors, queries=np.array(queries, dtype=str), responses=np.array(responses, dtype=str))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class SemanticCache:
+    """
+    Cache answers by query meaning: a query whose embedding is close enough to
+    an earlier query's is answered with the earlier response.
+
+    With a `path`, entries are saved to an .npz file and loaded again by the
+    next session, so questions from earlier sessions can be matched.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[str], Awaitable[list[float]]],
+        threshold: float = SIMILARITY_THRESHOLD,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        path: Optional[str] = None,
+    ):
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._vectors: Optional[np.ndarray] = None  # (N, dim), rows normalized to unit length
+        self._entries: list[tuple[str, str]] = []   # (query, response), parallel to _vectors
+
+        if path is not None:
+            self.load()
+
+    def load(self):
+        """Load the entries saved at `path`, if there are any."""
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                vectors, queries, responses = data["vectors"], data["queries"], data["responses"]
+        except (OSError, KeyError, ValueError):
+            return  # No usable cache file; start empty
+
+        if vectors.ndim != 2 or not len(vectors) == len(queries) == len(responses):
+            return
+
+        self._vectors = vectors[-self.max_entries:] if len(vectors) else None
+        self._entries = list(zip(queries.tolist(), responses.tolist()))[-self.max_entries:]
+
+    async def save(self):
+        """Write the entries to `path` off the event loop."""
+        if self.path is None or self._vectors is None:
+            return
+
+        queries = [query for query, _ in self._entries]
+        responses = [response for _, response in self._entries]
+        try:
+            await asyncio.to_thread(write_entries, self.path, self._vectors, queries, responses)
+        except OSError:
+            pass  # Persisting is best effort; the entries stay cached in memory
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def embed_unit(self, query: str) -> Optional[np.ndarray]:
+        """Embed a query as a unit vector, or return None if embedding fails."""
+        try:
+            vector = np.asarray(await self.embed(query), dtype=np.float32)
+        except Exception:
+            return None  # Embedding is best effort; callers fall through to generation
+
+        vector /= np.linalg.norm(vector) or 1.0
+        return vector
+
+    async def lookup(self, query: str) -> tuple[Optional[str], Optional[np.ndarray]]:
+        """Return a cached response (or None) and the query's embedding for add()."""
+        vector = await self.embed_unit(query)
+        if vector is None:
+            return None, None
+
+        # Entries embedded by a different model (another dimension) never match
+        if self._entries and self._vectors.shape[1] == vector.shape[0]:
+            # Rows and query are unit vectors, so the dot product is the cosine similarity
+            scores = self._vectors @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                self.hits += 1
+                return self._entries[best][1], vector
+
+        self.misses += 1
+        return None, vector
+
+    async def store(self, query: str, response: str, vector: Optional[np.ndarray] = None):
+        """Store a response, embedding the query unless lookup() already did."""
+        if vector is None:
+            vector = await self.embed_unit(query)
+        self.add(vector, query, response)
+        await self.save()
+
+    def add(self, vector: Optional[np.ndarray], query: str, response: str):
+        """Store a response under the embedding returned by lookup()."""
+        if vector is None:
+            return
+
+        if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+            # First entry, or the embedding model changed and older entries are useless
+            self._vectors = vector[np.newaxis, :]
+            self._entries = []
+        else:
+            self._vectors = np.vstack([self._vectors, vector])
+        self._entries.append((query, response))
+
+        # Drop the oldest entries
+        if len(self._entries) > self.max_entries:
+            overflow = len(self._entries) - self.max_entries
+            self._vectors = self._vectors[overflow:]
+            del self._entries[:overflow]
@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+
+from llm_cache import SemanticCache
+
+EMBEDDINGS = {
+    "what is python": [1.0, 0.0, 0.10],
+    "explain python": [1.0, 0.0, 0.12],
+    "what is rust": [0.0, 1.0, 0.0],
+}
+
+
+async def embed(query):
+    return EMBEDDINGS[query]
+
+
+class SemanticCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache", "semantic_cache.npz")
+
+    async def asyncTearDown(self):
+        self.directory.cleanup()
+
+    async def test_entries_persist_between_sessions(self):
+        await SemanticCache(embed, path=self.path).store("what is python", "A language")
+
+        cache = SemanticCache(embed, path=self.path)
+        self.assertEqual((await cache.lookup("explain python"))[0], "A language")
+        self.assertIsNone((await cache.lookup("what is rust"))[0])
+
+    async def test_other_embedding_dimension_never_matches(self):
+        await SemanticCache(embed, path=self.path).store("what is python", "A language")
+
+        async def embed_wider(query):
+            return [1.0, 0.0, 0.1, 0.0]
+
+        self.assertIsNone((await SemanticCache(embed_wider, path=self.path).lookup("what is python"))[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from tool_script import run_tool_script
+
+
+class ToolScriptTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.calls = []
+
+    async def call_tool(self, name, args):
+        self.calls.append((name, args))
+        return SimpleNamespace(content=[SimpleNamespace(text=f"{name} done")])
+
+    async def test_multiline_string_is_unchanged(self):
+        script = (
+            "content = '''first\n"
+            "second\n"
+            "  third'''\n"
+            "await call_tool('create_file', {'filename': 'a.txt', 'content': content})\n"
+        )
+        await run_tool_script(script, self.call_tool)
+
+        self.assertEqual(self.calls, [("create_file", {"filename": "a.txt", "content": "first\nsecond\n  third"})])
+
+    async def test_throwaway_loop_variable(self):
+        outputs = await run_tool_script("for _ in range(2):\n    print(await call_tool('echo', {}))", self.call_tool)
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(outputs[-1], {"print": "echo done"})
+
+    async def test_private_names_are_rejected(self):
+        outputs = await run_tool_script("print(__builtins__)", self.call_tool)
+
+        self.assertIn("'__builtins__' is not allowed", outputs[0]["error"])
+        self.assertEqual(self.calls, [])
+
+    @mock.patch("tool_script.SCRIPT_TIMEOUT", 1)
+    async def test_tool_calls_do_not_count_against_the_timeout(self):
+        async def slow_tool(name, args):
+            await asyncio.sleep(0.6)
+            return await self.call_tool(name, args)
+
+        outputs = await run_tool_script("for _ in range(3):\n    await call_tool('slow', {})", slow_tool)
+
+        self.assertEqual(len(self.calls), 3)
+        self.assertFalse(any("error" in output for output in outputs))
+
+    @mock.patch("tool_script.SCRIPT_TIMEOUT", 1)
+    async def test_runaway_script_times_out(self):
+        outputs = await run_tool_script("while True:\n    pass", self.call_tool)
+
+        self.assertIn("timed out", outputs[-1]["error"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# Lazy tool loading: expose a search tool instead of every tool definition
+import math
+import re
+from collections import Counter
+
+from google.genai.types import Tool, FunctionDeclaration
+
+SEARCH_TOOLS_NAME = "search_tools"
+SEARCH_TOOLS_DEFAULT_K = 5
+LAZY_TOOLS_THRESHOLD = 8  # Servers with more tools than this are searched instead of declared up front
+
+SEARCH_TOOLS_TOOL = Tool(function_declarations=[FunctionDeclaration(
+    name=SEARCH_TOOLS_NAME,
+    description=(
+        "Find tools for a task. Only a few tools are declared up front; call this with a short "
+        "description of what you need and the best matching tools become callable for the rest "
+        "of this request. Search again with different words if none fit."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "What the tool should do, e.g. 'read a file' or 'list running processes'",
+            },
+            "k": {
+                "type": "integer",
+                "description": f"Maximum number of tools to return (default {SEARCH_TOOLS_DEFAULT_K})",
+            },
+        },
+        "required": ["query"],
+    },
+)])
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase words; snake_case and camelCase names are split too."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", text or "")
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class ToolIndex:
+    """BM25 index over tool names, descriptions and parameter names."""
+
+    def __init__(self, tools: list[Tool], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.tools: dict[str, Tool] = {}
+        self._documents: list[tuple[str, Counter, int]] = []  # (name, term counts, length)
+
+        document_frequency = Counter()
+        for tool in tools:
+            for declaration in tool.function_declarations or []:
+                self.tools[declaration.name] = tool
+
+                words = tokenize(declaration.name) + tokenize(declaration.description)
+                parameters = declaration.parameters
+                for name in (parameters.properties if parameters else None) or {}:
+                    words += tokenize(name)
+
+                counts = Counter(words)
+                document_frequency.update(counts.keys())
+                self._documents.append((declaration.name, counts, len(words)))
+
+        count = len(self._documents)
+        self._average_length = sum(length for _, _, length in self._documents) / count if count else 0.0
+        self._idf = {
+            term: math.log(1 + (count - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    def search(self, query: str, k: int = SEARCH_TOOLS_DEFAULT_K) -> list[str]:
+        """Return the names of the best matching tools, best first."""
+        terms = tokenize(query)
+        scores = []
+
+        for name, counts, length in self._documents:
+            score = 0.0
+            for term in terms:
+                frequency = counts.get(term)
+                if frequency:
+                    norm = self.k1 * (1 - self.b + self.b * length / (self._average_length or 1.0))
+                    score += self._idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            if score > 0:
+                scores.append((score, name))
+
+        scores.sort(key=lambda item: item[0], reverse=True)
+        return [name for _, name in scores[:max(k, 1)]]
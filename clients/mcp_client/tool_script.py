@@ -0,0 +1,144 @@
+# Programmatic tool calling: run a model-written script that calls MCP tools locally
+import ast
+import asyncio
+import json
+import os
+import sys
+
+from google.genai.types import Tool, FunctionDeclaration
+
+from tool_script_runner import wrap_script
+
+TOOL_SCRIPT_NAME = "run_tool_script"
+
+TOOL_SCRIPT_TOOL = Tool(function_declarations=[FunctionDeclaration(
+    name=TOOL_SCRIPT_NAME,
+    description=(
+        "Run several tool calls in one step. Write the body of an async Python function that "
+        "calls tools with `output = await call_tool(name, args)`, where `output` is the tool's "
+        "text output. Loops, conditionals and print() are allowed; every tool output and printed "
+        "line is returned together. Imports are not allowed, nor are names or attributes starting with "
+        "'_' (a bare `_` variable is fine). A failed tool call raises RuntimeError. Prefer this over separate calls when a task needs more than one tool."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "script": {
+                "type": "string",
+                "description": "Python statements, e.g. `for f in ['a.txt', 'b.txt']: await call_tool('create_file', {'filename': f, 'content': ''})`",
+            },
+        },
+        "required": ["script"],
+    },
+)])
+
+SCRIPT_TIMEOUT = 60            # Seconds a tool script may run, outside its tool calls, before it is killed
+MAX_SCRIPT_TOOL_CALLS = 50     # Tool calls one script may make
+SCRIPT_LINE_LIMIT = 2 ** 24    # Largest message (one JSON line) a script may send back
+
+RUNNER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tool_script_runner.py")
+
+# Introspection attributes that lead from plain objects back to frames, code and globals
+BLOCKED_ATTRIBUTES = {
+    "ag_frame", "cr_frame", "f_back", "f_builtins", "f_code", "f_globals", "f_locals",
+    "gi_code", "gi_frame", "tb_frame", "tb_next",
+}
+
+# Variables kept in the script's environment; everything else, including API keys, is dropped
+INHERITED_ENV_VARS = ("PATH", "SYSTEMROOT", "TEMP", "TMP", "TMPDIR")
+
+
+def check_script(script: str):
+    """Reject scripts that import modules or reach for private names or introspection attributes."""
+    tree = wrap_script(script)
+
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            raise ValueError("Imports are not allowed in tool scripts")
+        if isinstance(node, ast.Attribute) and (node.attr.startswith("_") or node.attr in BLOCKED_ATTRIBUTES):
+            raise ValueError(f"Access to attribute '{node.attr}' is not allowed in tool scripts")
+        # The bare `_` is the usual throwaway loop variable and reaches nothing private
+        if isinstance(node, ast.Name) and node.id.startswith("_") and node.id != "_":
+            raise ValueError(f"Access to name '{node.id}' is not allowed in tool scripts")
+
+
+def tool_output_text(result) -> str:
+    """Join the text content of an MCP tool result."""
+    return "\n".join(item.text for item in result.content if getattr(item, "text", None) is not None)
+
+
+async def relay(process: asyncio.subprocess.Process, script: str, call_tool, outputs: list[dict], time_limit: float):
+    """
+    Send the script to the runner and serve its tool calls until it exits.
+    Raises TimeoutError once the script has run for `time_limit` seconds; time
+    spent in relayed tool calls does not count, as each tool has its own limit.
+    """
+    process.stdin.write(json.dumps({"script": script}).encode() + b"\n")
+    await process.stdin.drain()
+
+    loop = asyncio.get_running_loop()
+    remaining = time_limit
+
+    async def read_line() -> bytes:
+        nonlocal remaining
+        started = loop.time()
+        try:
+            return await asyncio.wait_for(process.stdout.readline(), max(remaining, 0))
+        finally:
+            remaining -= loop.time() - started
+
+    calls = 0
+    while line := await read_line():
+        message = json.loads(line)
+        if "call" not in message:
+            outputs.append(message)  # A printed line or the script's error
+            continue
+
+        calls += 1
+        if calls > MAX_SCRIPT_TOOL_CALLS:
+            reply = {"error": f"Tool scripts may make at most {MAX_SCRIPT_TOOL_CALLS} tool calls"}
+        else:
+            try:
+                text = tool_output_text(await call_tool(message["call"], message["args"]))
+                outputs.append({"tool": message["call"], "args": message["args"], "output": text})
+                reply = {"output": text}
+            except Exception as e:
+                reply = {"error": str(e)}
+
+        process.stdin.write(json.dumps(reply).encode() + b"\n")
+        await process.stdin.drain()
+
+
+async def run_tool_script(script: str, call_tool) -> list[dict]:
+    """Execute a tool script and return every tool output and printed line, in order.
+
+    The script runs in a separate Python process with a minimal environment
+    and is killed after SCRIPT_TIMEOUT seconds of its own run time; its tool
+    calls are relayed back here and made with `call_tool`, which is not timed.
+    """
+    try:
+        check_script(script)
+    except (SyntaxError, ValueError) as e:
+        return [{"error": f"{type(e).__name__}: {e}"}]
+
+    outputs = []
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-I", RUNNER_PATH,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        env={name: os.environ[name] for name in INHERITED_ENV_VARS if name in os.environ},
+        limit=SCRIPT_LINE_LIMIT,
+    )
+
+    try:
+        await relay(process, script, call_tool, outputs, SCRIPT_TIMEOUT)
+    except asyncio.TimeoutError:
+        outputs.append({"error": f"Tool script timed out after {SCRIPT_TIMEOUT} seconds"})
+    except (ValueError, ConnectionError) as e:
+        outputs.append({"error": f"Tool script failed: {e}"})
+    finally:
+        if process.returncode is None:
+            process.kill()
+        await process.wait()
+
+    return outputs
@@ -0,0 +1,70 @@
+# Child process for tool scripts: runs one script, relaying its tool calls to the client over stdio
+import ast
+import asyncio
+import builtins
+import json
+import sys
+
+# Builtins available to tool scripts; the process boundary, not this list, is what contains a script
+SAFE_BUILTINS = {
+    name: getattr(builtins, name)
+    for name in (
+        "abs", "all", "any", "bool", "dict", "enumerate", "Exception", "filter", "float",
+        "IndexError", "int", "isinstance", "KeyError", "len", "list", "map", "max", "min",
+        "range", "reversed", "round", "RuntimeError", "set", "sorted", "str", "sum", "tuple",
+        "TypeError", "ValueError", "zip",
+    )
+}
+
+protocol_out = sys.stdout
+
+
+def wrap_script(script: str) -> ast.Module:
+    """
+    Parse a script into the body of a coroutine so it can await call_tool.
+    The source text is left untouched, so multi-line strings keep their content.
+    """
+    module = ast.parse(script, "<tool_script>")
+    wrapper = ast.parse("async def __tool_script__():\n    pass\n", "<tool_script>")
+    wrapper.body[0].body = module.body + wrapper.body[0].body
+    return ast.fix_missing_locations(wrapper)
+
+
+def send(message: dict):
+    protocol_out.write(json.dumps(message, default=str) + "\n")
+    protocol_out.flush()
+
+
+async def call_tool(name: str, args: dict = None) -> str:
+    send({"call": name, "args": args or {}})
+    reply = json.loads(sys.stdin.readline())
+    if "error" in reply:
+        raise RuntimeError(reply["error"])
+    return reply["output"]
+
+
+def script_print(*values):
+    send({"print": " ".join(str(value) for value in values)})
+
+
+async def main():
+    # The protocol owns the real stdout; nothing else may write to it
+    sys.stdout = sys.stderr
+
+    script = json.loads(sys.stdin.readline())["script"]
+
+    namespace = {
+        "__builtins__": SAFE_BUILTINS,
+        "call_tool": call_tool,
+        "print": script_print,
+    }
+
+    try:
+        exec(compile(wrap_script(script), "<tool_script>", "exec"), namespace)
+        await namespace["__tool_script__"]()
+    except Exception as e:
+        send({"error": f"{type(e).__name__}: {e}"})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
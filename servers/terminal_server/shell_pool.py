@@ -0,0 +1,340 @@
+import asyncio
+import codecs
+import os
+import re
+import secrets
+import shlex
+import shutil
+import signal
+from typing import Awaitable, Callable, Optional
+
+POOL_SIZE = 4               # Maximum number of persistent shells (and concurrent commands)
+READ_CHUNK_SIZE = 65536
+OUTPUT_HEAD_BYTES = 32768   # Output kept from the start of a command for the tool result
+OUTPUT_TAIL_BYTES = 32768   # Output kept from the end; anything in between is only streamed
+COMMAND_TIMEOUT = 600       # Seconds before a command is killed
+REAP_TIMEOUT = 5            # Seconds to wait for a killed process to release its pipes
+
+# Characters that need a shell to interpret them; commands without any are exec'd directly
+SHELL_META = re.compile(r'[|&;<>()$`\\"\'*?\[\]{}#~=%\n]')
+
+OutputCallback = Callable[[str], Awaitable[None]]
+
+# Shell function that SIGKILLs what is left of a finished job ($1, its process
+# group) while it still writes into the shell's stdout, where its output would
+# land in the next command's result. Jobs that redirected their output (nohup,
+# servers logging to a file) keep running. Usually nothing is left, which one
+# kill -0 establishes; without /proc or pgrep the whole group is killed
+KILL_PIPE_WRITERS = b"""__mcp_kill_writers() {
+  local pid
+  kill -0 -- -$1 2>/dev/null || return 0
+  if [ ! -d /proc/$$/fd ] || ! command -v pgrep >/dev/null; then kill -9 -- -$1 2>/dev/null; return 0; fi
+  for pid in $(pgrep -g "$1"); do
+    { [ /proc/$pid/fd/1 -ef /proc/$$/fd/1 ] || [ /proc/$pid/fd/2 -ef /proc/$$/fd/1 ]; } && kill -9 "$pid" 2>/dev/null
+  done
+  return 0
+}
+"""
+
+
+class CommandOutput:
+    """
+    Collects a command's output in bounded memory: the first `head_limit` and
+    last `tail_limit` bytes are kept, whatever the command prints.
+    """
+
+    def __init__(
+        self,
+        on_output: Optional[OutputCallback] = None,
+        head_limit: int = OUTPUT_HEAD_BYTES,
+        tail_limit: int = OUTPUT_TAIL_BYTES,
+    ):
+        self.on_output = on_output
+        self.head_limit = head_limit
+        self.tail_limit = tail_limit
+        self.total_bytes = 0
+        self._head = bytearray()
+        self._tail = bytearray()
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    async def feed(self, data: bytes):
+        if not data:
+            return
+
+        self.total_bytes += len(data)
+
+        # Fill the head first, then keep a sliding window of the tail
+        room = self.head_limit - len(self._head)
+        if room > 0:
+            self._head += data[:room]
+        if len(data) > room:
+            self._tail += data[max(room, 0):]
+            if len(self._tail) > self.tail_limit:
+                del self._tail[:-self.tail_limit]
+
+        if self.on_output is not None:
+            text = self._decoder.decode(data)
+            if text:
+                await self.on_output(text)
+
+    def text(self) -> str:
+        skipped = self.total_bytes - len(self._head) - len(self._tail)
+        separator = f"\n...[{skipped} bytes truncated]...\n" if skipped else ""
+        return self._head.decode(errors="replace") + separator + self._tail.decode(errors="replace")
+
+
+def kill_group(pgid: int):
+    """Kill every process in a process group."""
+    if not hasattr(os, "killpg"):
+        return
+
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def kill_process_group(process: asyncio.subprocess.Process):
+    """Kill a process started in its own session, along with its children."""
+    if process.returncode is not None:
+        return
+
+    if hasattr(os, "killpg"):
+        kill_group(process.pid)
+    else:
+        # Without process groups only the process itself can be killed
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+
+
+async def reap(process: asyncio.subprocess.Process):
+    """
+    Wait for a killed process. Its pipes are drained first: the process only
+    counts as finished once they reach EOF, which a full, paused reader never sees.
+    """
+    async def drain(stream: Optional[asyncio.StreamReader]):
+        if stream is not None:
+            while await stream.read(READ_CHUNK_SIZE):
+                pass
+
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(drain(process.stdout), drain(process.stderr), process.wait()),
+            REAP_TIMEOUT,
+        )
+    except asyncio.TimeoutError:
+        pass  # Something outside its process group still holds a pipe; stop waiting
+
+
+def direct_argv(command: str) -> Optional[list[str]]:
+    """Return the argv for a command that can run without a shell, or None."""
+    if SHELL_META.search(command):
+        return None
+
+    argv = shlex.split(command)
+
+    # Builtins such as cd or export, and relative paths (resolved against the
+    # workspace, not our cwd), are left to the shell
+    if not argv or "/" in argv[0] or shutil.which(argv[0]) is None:
+        return None
+
+    return argv
+
+
+class ShellPool:
+    """
+    Pool of long-lived bash processes for running terminal commands.
+
+    Commands that need a shell are piped into an idle shell and their output
+    is read up to a per-command marker, so they pay no shell-startup cost.
+    Plain commands (no shell syntax, not a builtin) are exec'd directly.
+    Without bash (e.g. on Windows) every command gets its own system shell.
+    """
+
+    def __init__(self, cwd: str, size: int = POOL_SIZE, timeout: float = COMMAND_TIMEOUT):
+        self.cwd = cwd
+        self.size = size
+        self.timeout = timeout
+        self._idle: list[asyncio.subprocess.Process] = []
+        self._shell_slots = asyncio.Semaphore(size)  # One per shell, idle or busy
+        self._has_bash = shutil.which("bash") is not None
+        self._process_slots = asyncio.Semaphore(size)
+        self._reaping: set[asyncio.Task] = set()
+
+    async def _spawn(self) -> asyncio.subprocess.Process:
+        # The shell's own stderr is kept apart: it reports each command's job id
+        shell = await asyncio.create_subprocess_exec(
+            "bash", "--noprofile", "--norc",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=self.cwd,
+            start_new_session=True,
+        )
+
+        # Job control puts every command in its own process group
+        shell.stdin.write(b"set -m\n" + KILL_PIPE_WRITERS)
+        return shell
+
+    async def _acquire(self) -> asyncio.subprocess.Process:
+        # The caller holds a shell slot, so there is an idle shell or room to start one
+        while self._idle:
+            shell = self._idle.pop()
+            if shell.returncode is None:
+                return shell
+            # The shell died while idle; its slot is reused below
+
+        # Start shells lazily, up to the pool size
+        return await self._spawn()
+
+    def _discard(self, shell: asyncio.subprocess.Process):
+        # Also kills whatever the shell was running
+        kill_process_group(shell)
+
+        # Reap it in the background, so its transport is closed while the loop is still running
+        task = asyncio.get_running_loop().create_task(reap(shell))
+        self._reaping.add(task)
+        task.add_done_callback(self._reaping.discard)
+
+    async def run(self, command: str, on_output: Optional[OutputCallback] = None) -> tuple[Optional[int], str]:
+        """
+        Run a command and return its exit code and the head and tail of its
+        combined stdout/stderr. Output is passed to `on_output` as it arrives.
+        The exit code is None if the command timed out and was killed.
+        """
+        output = CommandOutput(on_output)
+
+        try:
+            exit_code = await asyncio.wait_for(self._dispatch(command, output), self.timeout)
+        except asyncio.TimeoutError:
+            exit_code = None
+
+        return exit_code, output.text()
+
+    async def _dispatch(self, command: str, output: CommandOutput) -> int:
+        argv = direct_argv(command)
+        if argv is not None:
+            return await self._run_exec(argv, output)
+
+        if not self._has_bash:
+            return await self._run_oneshot(command, output)
+
+        # Releasing the slot wakes a waiting command, whether the shell went back to the
+        # idle list or was discarded (the waiter then starts a new one)
+        async with self._shell_slots:
+            shell = await self._acquire()
+            try:
+                exit_code = await self._run_in(shell, command, output)
+            except BaseException:
+                # The shell's stream position is unknown now, so it cannot be reused
+                self._discard(shell)
+                raise
+
+            self._idle.append(shell)
+            return exit_code
+
+    async def _run_exec(self, argv: list[str], output: CommandOutput) -> int:
+        # Own session, so the command's whole process group can be signalled
+        async with self._process_slots:
+            process = await asyncio.create_subprocess_exec(
+                *argv,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=self.cwd,
+                start_new_session=True,
+            )
+            return await self._collect(process, output)
+
+    async def _run_oneshot(self, command: str, output: CommandOutput) -> int:
+        # Bounded like the pool, so concurrent calls cannot pile up processes
+        async with self._process_slots:
+            process = await asyncio.create_subprocess_shell(
+                command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=self.cwd,
+                start_new_session=True,
+            )
+            return await self._collect(process, output)
+
+    @staticmethod
+    async def _collect(process: asyncio.subprocess.Process, output: CommandOutput) -> int:
+        try:
+            while chunk := await process.stdout.read(READ_CHUNK_SIZE):
+                await output.feed(chunk)
+
+            return await process.wait()
+        except BaseException:
+            # Timed out or cancelled: don't leave the command running, and reap it
+            kill_process_group(process)
+            await reap(process)
+            raise
+
+    @staticmethod
+    async def _run_in(shell: asyncio.subprocess.Process, command: str, output: CommandOutput) -> int:
+        token = secrets.token_hex(8)
+        marker = f"__MCP_DONE_{token}__".encode()
+        job_tag = f"__MCP_JOB_{token}__".encode()
+
+        # eval keeps a malformed command from swallowing the marker line, the
+        # subshell keeps cd/exit/variable changes from leaking into later
+        # commands, and /dev/null stops commands from reading our stdin. Once
+        # the job exits, background processes still holding its output pipe
+        # are killed so they cannot write into the next command's output
+        shell.stdin.write((
+            f"( eval {shlex.quote(command)} ) </dev/null 2>&1 & __mcp_job=$!; "
+            f"echo \"{job_tag.decode()} $__mcp_job\" >&2; "
+            f"wait $__mcp_job; __mcp_status=$?; __mcp_kill_writers $__mcp_job; "
+            f"echo \"{marker.decode()} $__mcp_status\"\n"
+        ).encode())
+        await shell.stdin.drain()
+
+        # Skip any job notices the shell printed before this command's job id
+        while True:
+            line = await shell.stderr.readline()
+            if not line:
+                raise ConnectionResetError("Shell exited before the command started")
+            if line.startswith(job_tag):
+                job = int(line[len(job_tag):])
+                break
+
+        try:
+            return await ShellPool._read_until_marker(shell, marker, output)
+        except BaseException:
+            # The caller discards the shell, but the job has its own process group
+            kill_group(job)
+            raise
+
+    @staticmethod
+    async def _read_until_marker(shell: asyncio.subprocess.Process, marker: bytes, output: CommandOutput) -> int:
+        async def read_chunk() -> bytes:
+            chunk = await shell.stdout.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise ConnectionResetError("Shell exited before the command finished")
+            return chunk
+
+        # Pass output on as it arrives, holding back anything that could be the start of the marker
+        pending = bytearray()
+        while True:
+            pending += await read_chunk()
+            index = pending.find(marker)
+            if index != -1:
+                break
+
+            ready = len(pending) - len(marker) + 1
+            if ready > 0:
+                await output.feed(bytes(pending[:ready]))
+                del pending[:ready]
+
+        await output.feed(bytes(pending[:index]))
+
+        # Wait for the exit status that follows the marker
+        status = pending[index + len(marker):]
+        while b"\n" not in status:
+            status += await read_chunk()
+
+        return int(status[:status.index(b"\n")])
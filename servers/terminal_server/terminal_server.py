@@ -1,9 +1,12 @@
 import os
-import subprocess
+import atexit
+import queue
 import logging
 import logging.handlers
-import json
-from mcp.server.fastmcp import FastMCP
+import orjson
+from mcp.server.fastmcp import FastMCP, Context
+
+from shell_pool import ShellPool
 
 # -------------------------------
 # Logging Setup
@@ -11,6 +14,9 @@ from mcp.server.fastmcp import FastMCP
 LOG_DIR = "./logs"
 os.makedirs(LOG_DIR, exist_ok=True)
 
+# Attributes every LogRecord has; anything else on a record came from `extra`
+STANDARD_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
 class JsonFormatter(logging.Formatter):
     """Custom JSON log formatter"""
     def format(self, record):
@@ -22,9 +28,25 @@ class JsonFormatter(logging.Formatter):
             "function": record.funcName,
             "line": record.lineno
         }
+        # Include fields passed via `extra` (command, exit_code, ...)
+        for key, value in record.__dict__.items():
+            if key not in STANDARD_RECORD_ATTRS:
+                log_record[key] = value
         if record.exc_info:
             log_record["exception"] = self.formatException(record.exc_info)
-        return json.dumps(log_record)
+        return orjson.dumps(log_record, default=str).decode()
+
+class ExtraLoggerAdapter(logging.LoggerAdapter):
+    """LoggerAdapter that merges its static fields into each call's `extra`"""
+    def process(self, msg, kwargs):
+        kwargs["extra"] = {**self.extra, **kwargs.get("extra", {})}
+        return msg, kwargs
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that enqueues records unformatted, keeping exc_info for JsonFormatter"""
+    def prepare(self, record):
+        # The listener is in-process, so records need no pickling-safe preparation
+        return record
 
 logger = logging.getLogger("terminal_server")
 logger.setLevel(logging.INFO)
@@ -33,7 +55,8 @@ logger.setLevel(logging.INFO)
 file_handler = logging.handlers.RotatingFileHandler(
     os.path.join(LOG_DIR, "server.log"),
     maxBytes=5 * 1024 * 1024,
-    backupCount=5
+    backupCount=5,
+    encoding="utf-8"  # orjson writes non-ASCII characters unescaped
 )
 file_handler.setFormatter(JsonFormatter())
 
@@ -41,8 +64,20 @@ file_handler.setFormatter(JsonFormatter())
 console_handler = logging.StreamHandler()
 console_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
 
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+# Handlers run on a background listener thread; logging calls only enqueue the record
+log_queue = queue.Queue(-1)
+logger.addHandler(LocalQueueHandler(log_queue))
+# FastMCP puts a RichHandler on the root logger, which would format every record again on the loop
+logger.propagate = False
+
+log_listener = logging.handlers.QueueListener(
+    log_queue, file_handler, console_handler, respect_handler_level=True
+)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+# Pre-bound logger for run_command records
+cmd_logger = ExtraLoggerAdapter(logger, {"tool": "run_command"})
 
 # -------------------------------
 # MCP Server Setup
@@ -52,32 +87,54 @@ DEFAULT_WORKSPACE = os.path.expanduser(
     "/run/media/reyandabreo/Projects/MCP/MCP_Client_Server_Testing/workspace"
 )
 
+WORKSPACE_REALPATH = os.path.realpath(DEFAULT_WORKSPACE)
+WRITE_CHUNK_SIZE = 1024 * 1024  # Large file contents are written in 1 MiB chunks
+
+# Persistent shells that run_command pipes its commands into
+shell_pool = ShellPool(DEFAULT_WORKSPACE)
+
+def resolve_workspace_path(filename: str) -> str:
+    """Resolve a filename inside the workspace, rejecting paths that escape it."""
+    filepath = os.path.realpath(os.path.join(WORKSPACE_REALPATH, filename))
+    if os.path.commonpath([WORKSPACE_REALPATH, filepath]) != WORKSPACE_REALPATH:
+        raise ValueError(f"'{filename}' is outside the workspace")
+    return filepath
+
 @mcp.tool()
-async def run_command(command: str) -> str:
+async def run_command(command: str, ctx: Context) -> str:
     """
     Run a terminal command inside the workspace directory.
+    Each command starts in the workspace directory (cd does not persist between calls);
+    stdout and stderr are combined. Output is streamed to the client as progress
+    notifications; the result holds the start and end of the output and the exit code.
+    Commands running longer than 10 minutes are killed. Background processes are
+    killed when the command finishes unless their output is redirected, e.g.
+    `nohup python -m http.server > server.log 2>&1 &` keeps running.
     Logs all commands and outputs in structured JSON.
     """
-    logger.info(f"Received command: {command}")
+    cmd_logger.info("Received command: %s", command)
+
+    streamed_chars = 0
+
+    async def stream_output(text: str):
+        nonlocal streamed_chars
+        streamed_chars += len(text)
+        await ctx.report_progress(progress=streamed_chars, message=text)
 
     try:
-        result = subprocess.run(
-            command, 
-            shell=True, 
-            cwd=DEFAULT_WORKSPACE, 
-            capture_output=True, 
-            text=True
-        )
-        
-        output = result.stdout or result.stderr
-        logger.info(
-            f"Command executed",
-            extra={"command": command, "exit_code": result.returncode, "output": output[:200]}  # truncate output
-        )
-
-        return output
+        exit_code, output = await shell_pool.run(command, on_output=stream_output)
+
+        if logger.isEnabledFor(logging.INFO):
+            cmd_logger.info(
+                "Command executed",
+                extra={"command": command, "exit_code": exit_code, "output": output[:200]}  # truncate output
+            )
+
+        if exit_code is None:
+            return f"{output}\n[timed out after {shell_pool.timeout}s and was killed]"
+        return f"{output}\n[exit code: {exit_code}]"
     except Exception as e:
-        logger.error("Error running command", exc_info=True, extra={"command": command})
+        cmd_logger.error("Error running command", exc_info=True, extra={"command": command})
         return str(e)
 
 @mcp.tool()
@@ -93,9 +150,21 @@ async def create_file(filename: str, content: str) -> str:
         A success message or error.
     """
     try:
-        filepath = os.path.join(DEFAULT_WORKSPACE, filename)
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write(content)
+        filepath = resolve_workspace_path(filename)
+        data = memoryview(content.encode("utf-8"))
+
+        # O_NOFOLLOW: the checked path must not be swapped for a symlink before the open;
+        # O_BINARY (Windows only) stops newline translation of the encoded bytes
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_NOFOLLOW", 0) | getattr(os, "O_BINARY", 0)
+        fd = os.open(filepath, flags, 0o644)
+        try:
+            # os.write may write fewer bytes than asked
+            while data:
+                written = os.write(fd, data[:WRITE_CHUNK_SIZE])
+                data = data[written:]
+        finally:
+            os.close(fd)
+
         return f"✅ File '{filename}' created successfully in workspace."
     except Exception as e:
         return f"❌ Error creating file: {str(e)}"
@@ -0,0 +1,52 @@
+import asyncio
+import tempfile
+import unittest
+
+from shell_pool import ShellPool
+
+
+class ShellPoolTimeoutTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.workspace = tempfile.TemporaryDirectory()
+        self.pool = ShellPool(self.workspace.name, size=2, timeout=1)
+
+    async def asyncTearDown(self):
+        self.workspace.cleanup()
+
+    async def test_runaway_output_times_out(self):
+        # Output nobody reads fills the pipe; the kill must still be reaped
+        exit_code, _ = await asyncio.wait_for(self.pool.run("yes"), 10)
+        self.assertIsNone(exit_code)
+
+    async def test_runaway_output_in_shell_times_out(self):
+        async def on_output(text):
+            pass
+
+        exit_code, _ = await asyncio.wait_for(self.pool.run("yes | cat", on_output), 10)
+        self.assertIsNone(exit_code)
+
+        # The shell was discarded and the pool still works
+        self.assertEqual(await self.pool.run("echo ok && true"), (0, "ok\n"))
+
+
+class ShellPoolWaiterTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.workspace = tempfile.TemporaryDirectory()
+        self.pool = ShellPool(self.workspace.name, size=1, timeout=30)
+
+    async def asyncTearDown(self):
+        self.workspace.cleanup()
+
+    async def test_discarded_shell_wakes_waiter(self):
+        busy = asyncio.create_task(self.pool.run("sleep 20 && true"))
+        await asyncio.sleep(0.5)
+        waiting = asyncio.create_task(self.pool.run("echo next && true"))
+        await asyncio.sleep(0.2)
+
+        # Cancelling the busy command discards its shell; the waiter must get a new one
+        busy.cancel()
+        self.assertEqual(await asyncio.wait_for(waiting, 5), (0, "next\n"))
+
+
+if __name__ == "__main__":
+    unittest.main()